@@ -1,8 +1,7 @@
 import fnmatch
 import os
 import random
-from multiprocessing import Process
-from time import sleep
+import signal
 
 import numpy as np
 
@@ -10,40 +9,44 @@ from page_rank.model.tools.utils import install_requirements, \
     PageRankNoConvergence, getLogger
 
 
-def _mk_label(n):
-    return '#%d' % n
+def _mk_labels(node_count):
+    return np.char.add('#', np.arange(node_count).astype(str))
 
 
-def _mk_edges(node_count, edge_count):
-    import tqdm
-
+def _mk_edges(node_count, edge_count, labels):
     # Under these constraints we can comply with the requirements below
     assert node_count <= edge_count <= node_count ** 2, \
         "Need node_count=%d < edge_count=%d < %d " % (node_count,
         edge_count, node_count ** 2)
 
-    def _mk_node():
-        return random.randint(0, node_count - 1)
+    # Seeded from `random', so that random.seed(...) still reproduces graphs
+    rs = np.random.RandomState(random.getrandbits(32))
 
-    # Ensures no double edges
-    edges = set([])
+    # Edges are encoded as keys `src * node_count + tgt'
+    max_edges = node_count ** 2
 
     # Ensures no dangling nodes
-    for i in range(node_count):
-        edges.add((i, _mk_node()))
-
-    for _ in tqdm.tqdm(range(node_count, edge_count), desc="Generating edges",
-                       initial=node_count, total=edge_count):
-        while True:
-            prev_len = len(edges)
-            edges.add((_mk_node(), _mk_node()))
-            if len(edges) > prev_len:
-                break
-            # else, continue because we've added an already existing edge
+    keys = np.arange(node_count, dtype=np.int64) * node_count + \
+        rs.randint(0, node_count, node_count)
+
+    # Ensures no double edges
+    if edge_count * 2 > max_edges:
+        # Dense graph: pick among the edges not drawn yet
+        pool = np.setdiff1d(np.arange(max_edges, dtype=np.int64), keys)
+        keys = np.concatenate(
+            (keys, rs.permutation(pool)[:edge_count - node_count]))
+    else:
+        # Sparse graph: over-sample, then drop the double edges
+        while len(keys) < edge_count:
+            missing = edge_count - len(keys)
+            keys = np.concatenate((keys, rs.randint(
+                0, max_edges, int(missing * 1.3) + 1, dtype=np.int64)))
+            _, first_idx = np.unique(keys, return_index=True)
+            keys = keys[np.sort(first_idx)][:edge_count]
 
     # Map node ids to formatted strings
-    return [(_mk_label(src), _mk_label(tgt))
-            for src, tgt in tqdm.tqdm(edges, desc="Formatting edges")]
+    return zip(labels[keys // node_count].tolist(),
+               labels[keys % node_count].tolist())
 
 
 def mk_path(path):
@@ -66,11 +69,29 @@ def mk_path(path):
     return path
 
 
+def _next_run_id(save_dir):
+    counter_path = os.path.join(save_dir, '.next_run')
+
+    if os.path.exists(counter_path):
+        with open(counter_path) as fd:
+            i = int(fd.read())
+    else:
+        # No counter yet, resume after the runs already saved
+        ids = [f[4:-4] for f in fnmatch.filter(os.listdir(save_dir),
+                                               'run-*.csv')]
+        i = max([int(n) for n in ids if n.isdigit()] + [0]) + 1
+
+    with open(counter_path, 'w') as fd:
+        fd.write(str(i + 1))
+
+    return i
+
+
 def save_plot_data(path, data):
     import matplotlib.pyplot as plt
 
     save_dir = mk_path(path)
-    i = max(map(int, [f[4:-4] for f in os.listdir(save_dir)] + [0])) + 1
+    i = _next_run_id(save_dir)
 
     np.savetxt(os.path.join(save_dir, 'run-%d.csv' % i), data, delimiter=',')
     plt.savefig(os.path.join(save_dir, 'run-%d.png' % i))
@@ -79,10 +100,10 @@ def save_plot_data(path, data):
 
 
 def mk_graph(node_count, edge_count):
-    labels = map(_mk_label, list(range(node_count)))
-    edges = _mk_edges(node_count, edge_count)
+    labels = _mk_labels(node_count)
+    edges = _mk_edges(node_count, edge_count, labels)
 
-    return edges, labels
+    return edges, labels.tolist()
 
 
 def runner(fn, node_count=None, edge_count=None, **kwargs):
@@ -111,22 +132,19 @@ def setup_cli_and_run(parser, fn):
         install_requirements()
 
     # Set timer to terminate simulation after `timeout` seconds
-    p = None
     if timeout is not None:
-        def worker(pid):
-            getLogger().important('Will time out in {} sec...'.format(timeout))
-            sleep(timeout)
-
-            getLogger().error('Timing out after {} sec!'.format(timeout))
-            os.system('kill -TERM %d' % pid)
+        def _handle_timeout(signum, frame):
+            getLogger().error('Timing out after %d sec!', timeout)
+            # Not SystemExit: exiting waits on sPyNNaker's non-daemon threads
+            os.kill(os.getpid(), signal.SIGTERM)
 
-        p = Process(target=worker, args=(os.getpid(),))
-        p.start()
+        getLogger().important('Will time out in %d sec...', timeout)
+        signal.signal(signal.SIGALRM, _handle_timeout)
+        signal.alarm(timeout)
 
     # Run simulation
     try:
         exit(fn(**kwargs))
     finally:
         # Cancel timer
-        if p is not None:
-            p.terminate()
+        signal.alarm(0)
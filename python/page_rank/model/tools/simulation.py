@@ -7,7 +7,7 @@ import numpy as np
 
 from page_rank.model.tools.utils import FailedOnWarningError, \
     graph_visualiser, to_fp, getLogger, silence_output, node_formatter, \
-    format_ranks_string, compute_page_rank
+    format_ranks_string, prepare_page_rank, compute_page_rank_prepared
 from page_rank.model.tools.spinnaker_adapter import SpiNNakerAdapter
 
 FLOAT_PRECISION = 5
@@ -104,6 +104,7 @@ class PageRankSimulation:
         self._sim_ranks = None
         self._sim_convergence = None
         self._input_networkx_repr = None
+        self._page_rank_repr = None
         self._simulation_has_ran = False
 
         # Numpy printing with some precision and no scientific notation
@@ -150,6 +151,13 @@ class PageRankSimulation:
             self._input_networkx_repr = g
         return self._input_networkx_repr
 
+    def _init_page_rank_repr(self):
+        if self._page_rank_repr is None:
+            # Sparse graph structure for Page Rank python computations
+            g = self._init_networkx_repr()
+            self._page_rank_repr = prepare_page_rank(g)
+        return self._page_rank_repr
+
     def _extract_sim_ranks(self):
         """Extracts the rank computed during the simulation.
 
@@ -273,12 +281,13 @@ class PageRankSimulation:
         """
 
         # Init graph structure
-        g = self._init_networkx_repr()
+        prepared = self._init_page_rank_repr()
         labels = self._labels
         d = self._get_damping_factor()
         d_sum = self._get_damping_sum()
 
-        return compute_page_rank(g, labels, d, d_sum, tol, max_iter)
+        return compute_page_rank_prepared(prepared, labels, d, d_sum, tol,
+                                          max_iter)
 
     @graph_visualiser
     def draw_input_graph(self, save_graph=False):
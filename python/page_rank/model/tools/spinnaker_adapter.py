@@ -1,5 +1,6 @@
 import io
 import logging
+from collections import Counter
 
 import numpy as np
 
@@ -129,14 +130,18 @@ class SpiNNakerAdapter(SpiNNakerAdapterInterface):
         router_prov = router_provenance(m._txrx, m._machine, m._router_tables,
                                         True)
 
-        res = dict().fromkeys(collect_names, 0)
+        debug = _logger.isEnabledFor(logging.DEBUG)
+
+        names = set(collect_names)
+        counts = Counter()
         for item in router_prov:
-            _logger.debug('{} => {}'.format(item.names, item.value))
+            if debug:
+                _logger.debug('%s => %s', item.names, item.value)
             name = item.names[-1]
-            if name in collect_names:
-                res[name] += int(item.value)
+            if name in names:
+                counts[name] += int(item.value)
 
-        return res
+        return {name: counts[name] for name in collect_names}
 
     def has_provenance_warnings(self):
         """Whether the simulation produced provenance data warnings.
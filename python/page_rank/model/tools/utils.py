@@ -3,13 +3,30 @@ import logging
 import os
 import signal
 import site
+import subprocess
 import sys
+import time
+from collections import Counter
 from contextlib import contextmanager
 from functools import wraps
 
-from page_rank.model.tools.fixed_point import FXfamily
+import numpy as np
+
+from page_rank.model.tools.fixed_point import FXfamily, FXnum
+
+try:
+    import numba
+except ImportError:  # optional, compute_page_rank falls back to NumPy
+    numba = None
+
+try:
+    from importlib import reload
+except ImportError:  # Python 2, reload is a builtin
+    pass
 
 ITER_BITS = 2  # see c_models/src/neuron/messages/in_messages.h
+FRAC_BITS = 32  # ranks are UFRACT 0.32 values on SpiNNaker
+NATIVE_MIN_EDGES = 10 ** 6  # below, numba's ~1s JIT costs more than it saves
 LOG_IMPORTANT = (logging.INFO + logging.WARNING) // 2
 
 
@@ -30,7 +47,7 @@ class GUITimeoutError(Exception):
 #
 
 
-_fp_builder = FXfamily(n_bits=32)
+_fp_builder = FXfamily(n_bits=FRAC_BITS)
 
 
 def to_fp(n):
@@ -38,9 +55,35 @@ def to_fp(n):
 
 
 def to_hex(fp):
+    """Formats a scaled fixed-point value, see `fp_from_float`."""
+    fp = FXnum(family=_fp_builder, scaled_value=int(fp))
     return fp.toBinaryString(logBase=4, twosComp=False)
 
 
+def fp_from_float(x):
+    """Scales a float, or array of floats, to int64 fixed-point values.
+
+    Truncates like `to_fp`, the values have FRAC_BITS fractional bits.
+    """
+    return np.int64(np.multiply(x, 1 << FRAC_BITS))
+
+
+def fp_to_float(x):
+    return np.divide(x, float(1 << FRAC_BITS))
+
+
+def fp_mul(a, b):
+    """Multiplies scaled fixed-point values, rounding like FXnum.__mul__.
+
+    The 64 bits product of two 0.32 values may overflow an int64, so `b` is
+    split into 16 bits halves which are multiplied separately.
+    """
+    half = FRAC_BITS // 2
+    hi = a * (b >> half)
+    lo = a * (b & ((1 << half) - 1)) + (1 << (FRAC_BITS - 1))
+    return (hi + (lo >> half)) >> half
+
+
 def getLogger(name=__name__, log_level=logging.INFO):
     logger = logging.getLogger(name)
 
@@ -110,7 +153,8 @@ def install_requirements(requirements_file=None):
         requirements_file = os.path.realpath(
             os.path.join(os.path.dirname(__file__), '../requirements.txt'))
 
-    os.system('pip install --user -r "{}"'.format(requirements_file))
+    subprocess.check_call([sys.executable, '-m', 'pip', 'install', '--user',
+                           '-r', requirements_file])
     reload(site)
 
 
@@ -126,12 +170,19 @@ def gui_timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
                     seconds, os.getenv('DISPLAY')))
 
         def wrapper(*args, **kwargs):
-            signal.signal(signal.SIGALRM, _handle_timeout)
-            signal.alarm(seconds)
+            prev_handler = signal.signal(signal.SIGALRM, _handle_timeout)
+            prev_alarm = signal.alarm(seconds)
+            start = time.time()
             try:
                 result = func(*args, **kwargs)
             finally:
                 signal.alarm(0)
+                signal.signal(signal.SIGALRM, prev_handler)
+
+                # Re-arm the enclosing alarm, e.g. the examples' --timeout
+                if prev_alarm:
+                    elapsed = int(time.time() - start)
+                    signal.alarm(max(1, prev_alarm - elapsed))
             return result
 
         return wraps(func)(wrapper)
@@ -193,14 +244,20 @@ def extract_router_provenance(collect_names=None):
     router_provenance = RouterProvenanceGatherer()
     router_prov = router_provenance(m._txrx, m._machine, m._router_tables, True)
 
-    res = dict().fromkeys(collect_names, 0)
+    # Not getLogger(), which resets the log level
+    log = logging.getLogger(__name__)
+    debug = log.isEnabledFor(logging.DEBUG)
+
+    names = set(collect_names)
+    counts = Counter()
     for item in router_prov:
-        getLogger().debug('{} => {}'.format(item.names, item.value))
+        if debug:
+            log.debug('%s => %s', item.names, item.value)
         name = item.names[-1]
-        if name in collect_names:
-            res[name] += int(item.value)
+        if name in names:
+            counts[name] += int(item.value)
 
-    return res
+    return {name: counts[name] for name in collect_names}
 
 
 def node_formatter(name):
@@ -226,11 +283,11 @@ def format_ranks_string(labels, ranks, diff_only=False, diff_max=50):
     if diff_only and len(ranks) == 2:
         # Filter out valid ranks
         [(lbl1, row_1), (lbl2, row_2)] = ranks.items()
-        diff_idx = [i for i, (r1, r2) in enumerate(zip(row_1, row_2))
-                    if abs(r1 - r2) >= TOL]
+        row_1, row_2 = np.asarray(row_1), np.asarray(row_2)
+        diff_idx = np.flatnonzero(np.abs(row_1 - row_2) >= TOL)
         labels = [labels[i] for i in diff_idx]
-        row_1 = [row_1[i] for i in diff_idx]
-        row_2 = [row_2[i] for i in diff_idx]
+        row_1 = row_1[diff_idx].tolist()
+        row_2 = row_2[diff_idx].tolist()
         if len(diff_idx) > diff_max:
             compacted_label = "{}..{}".format(labels[diff_max], labels[-1])
             labels = labels[:diff_max] + [compacted_label]
@@ -250,12 +307,152 @@ def format_ranks_string(labels, ranks, diff_only=False, diff_max=50):
     return table.get_string()
 
 
+def _iterate_page_rank(m, out_deg, x, d, d_sum, tol, max_iter, nodes):
+    """Iterates Page Rank with NumPy, tracing ranks when debug is enabled.
+
+    :return: ( <np.array> fixed-point ranks, <int> # iterations required, or 0
+               if it did not converge )
+    """
+    # Loop invariants
+    damped = d != fp_from_float(1.)
+    max_err = len(x) * tol
+
+    # Traces are per node, only format them when they are actually logged.
+    # Not getLogger(), which resets the log level.
+    log = logging.getLogger(__name__)
+    debug = log.isEnabledFor(logging.DEBUG)
+
+    for iter_no in range(max_iter):
+        if debug:
+            log.debug('\n===== TIME STEP = %d =====', iter_no)
+        x_last = x
+
+        # x / n in fixed-point rounds to the same value as an integer division
+        pkt = x_last // out_deg
+        if debug:
+            for node, p in zip(nodes, pkt):
+                log.debug('[t=%04d|#%3s] Sending pkt %f[%s]',
+                          iter_no, node, fp_to_float(p), to_hex(p))
+
+        # Exchange ranks
+        # Simulates payload-lossy encoding of the iteration
+        # See c_models/src/neuron/in_messages.h
+        #   function: in_messages_payload_format
+        x = m.dot((pkt >> ITER_BITS) << ITER_BITS)
+
+        # Compute dangling factor
+        if damped:
+            x = d_sum + fp_mul(d, x)
+
+        if debug:
+            for node, r in zip(nodes, x):
+                log.debug('[t=%04d|#%3s] Rank %f[%s]',
+                          iter_no, node, fp_to_float(r), to_hex(r))
+
+        # Check convergence, l1 norm
+        err = np.abs(x - x_last).sum()
+        if err < max_err:
+            return x, iter_no + 1  # iter t+1 happens at the end of time t
+
+    return x, 0
+
+
+def _exchange_ranks_native(indptr, indices, data, pkt, damped, d, d_sum, x):
+    """Sums the packets sent to each node into `x`, then applies damping.
+
+    `indptr` and `indices` are the CSR arrays of the transposed adjacency
+    matrix: each node pulls the packets of its incoming edges, so nodes are
+    updated in parallel without sharing any accumulator.
+    """
+    for i in numba.prange(len(x)):
+        rank = 0
+        for k in range(indptr[i], indptr[i + 1]):
+            rank += data[k] * pkt[indices[k]]
+        if damped:
+            rank = d_sum + _fp_mul_native(d, rank)
+        x[i] = rank
+
+
+def _iterate_page_rank_native(indptr, indices, data, out_deg, x, d, d_sum,
+                              tol, max_iter):
+    """Same as `_iterate_page_rank`, compiled by numba and without traces.
+
+    The initial ranks `x` are overwritten, as it is used as a work buffer.
+    """
+    damped = d != 1 << FRAC_BITS
+    max_err = len(x) * tol
+    x_last = np.empty_like(x)
+
+    for iter_no in range(max_iter):
+        # Two buffers alternate between ranks and previous ranks: safe since
+        # _exchange_ranks_native assigns every rank, it never accumulates
+        # into the stale values of the buffer it writes
+        x, x_last = x_last, x
+        pkt = ((x_last // out_deg) >> ITER_BITS) << ITER_BITS
+        _exchange_ranks_native(
+            indptr, indices, data, pkt, damped, d, d_sum, x)
+
+        if np.abs(x - x_last).sum() < max_err:
+            return x, iter_no + 1
+
+    return x, 0
+
+
+if numba is not None:
+    _fp_mul_native = numba.njit(cache=True)(fp_mul)
+    _exchange_ranks_native = numba.njit(cache=True, parallel=True)(
+        _exchange_ranks_native)
+    # Not cached, loading a cached caller of a parallel function segfaults
+    _iterate_page_rank_native = numba.njit(_iterate_page_rank_native)
+else:
+    _iterate_page_rank_native = None
+
+
+def prepare_page_rank(g):
+    """Builds the sparse representation of a graph for `compute_page_rank`.
+
+    Only depends on the graph structure, so it can be reused across Page Rank
+    computations with different parameters.
+
+    :param g: input graph, every node needs at least one outgoing edge
+    :return: ( <list> nodes, <dict> node-indexed node ids, <csr_matrix>
+               transposed adjacency matrix, <np.array> out-degrees )
+    """
+    import scipy.sparse
+
+    nodes = list(g)
+    n = len(nodes)
+
+    # Walk the adjacency of each node once, straight into CSR arrays
+    node_ids = dict(zip(nodes, range(n)))
+    out_deg = np.fromiter((len(g[v]) for v in nodes), np.int64, count=n)
+
+    # Ranks are divided by out-degrees, sinks would silently leak rank mass
+    sinks = np.flatnonzero(out_deg == 0)
+    if len(sinks):
+        raise ValueError("Found %d nodes without outgoing edges: %s." % (
+            len(sinks), ', '.join(str(nodes[i]) for i in sinks)))
+
+    indices = np.fromiter((node_ids[t] for v in nodes for t in g[v]),
+                          np.int64, count=out_deg.sum())
+    indptr = np.concatenate(([0], np.cumsum(out_deg)))
+
+    # Sparse adjacency matrix, transposed: row `tgt` holds the incoming edges
+    m = scipy.sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int64), indices, indptr),
+        shape=(n, n)).T.tocsr()
+
+    return nodes, node_ids, m, out_deg
+
+
 def compute_page_rank(g, labels, d, d_sum, tol, max_iter=100):
     """Return the PageRank of the nodes in the graph.
 
     Adapted to:
      - use binary fixed-point arithmetic operations, like SpiNNaker
      - return the # of iterations required to compute the Page Rank
+     - iterate with sparse matrix-vector products on the scaled fixed-point
+       values, rather than on per-edge FXnum objects
 
     Source
     ------
@@ -268,63 +465,42 @@ def compute_page_rank(g, labels, d, d_sum, tol, max_iter=100):
     :param d_sum: damping sum
     :param tol: convergence tolerance
     :param max_iter: max iteration count before giving up on convergence
-    :return: ( <dict> node-indexed dict of ranks, <int> # iterations required )
+    :return: ( <np.array> ranks in the order of `labels', or a node-indexed
+               <dict> of ranks if no labels, <int> # iterations required )
     """
-    import networkx as nx
-    import numpy as np
+    return compute_page_rank_prepared(
+        prepare_page_rank(g), labels, d, d_sum, tol, max_iter)
+
 
-    w = nx.stochastic_graph(g, weight=None)
-    n = w.number_of_nodes()
+def compute_page_rank_prepared(prepared, labels, d, d_sum, tol, max_iter=100):
+    """Same as `compute_page_rank`, on a graph from `prepare_page_rank`."""
+    nodes, node_ids, m, out_deg = prepared
+    n = len(nodes)
 
     # Init fixed-point constants
-    d = to_fp(d)
-    tol = to_fp(tol)
-    zero = to_fp(0)
-    one = to_fp(1.)
-    n = to_fp(n)
-    d_sum = to_fp(d_sum)
+    d = fp_from_float(d)
+    one = fp_from_float(1.)
+    d_sum = fp_from_float(d_sum)
+    tol = fp_from_float(tol)
 
     # Iterate up to max_iter iterations
-    x = dict.fromkeys(w, one / n)
-    for iter_no in range(max_iter):
-        getLogger().debug('\n===== TIME STEP = {} ====='.format(iter_no))
-        x_last = x
-        x = dict.fromkeys(x_last.keys(), zero)
-
-        for node in x:
-            pkt = x_last[node] / to_fp(len(w[node]))
-            getLogger().debug('[t=%04d|#%3s] Sending pkt %f[%s]' % (
-                iter_no, node, pkt, to_hex(pkt)))
-
-            # Exchange ranks
-            for conn_node in w[node]:  # edge: node -> conn_node
-                prev = x[conn_node]
-                # Simulates payload-lossy encoding of the iteration
-                # See c_models/src/neuron/in_messages.h
-                #   function: in_messages_payload_format
-                x[conn_node] += ((pkt >> ITER_BITS) << ITER_BITS)
-                getLogger().debug("[idx=%3s] %f[%s] + %f[%s] = %f[%s]" % (
-                    conn_node, prev, to_hex(prev), pkt,
-                    to_hex(pkt), x[conn_node],
-                    to_hex(x[conn_node])))
-
-        # Compute dangling factor
-        if d != one:
-            for node in x:
-                prev = x[node]
-                x[node] = d_sum + d * x[node]
-                getLogger().debug(
-                    "[idx=%3s] %f[%s] * %f[%s] + %f[%s] = %f[%s]" % (
-                        node, d, to_hex(d), prev, to_hex(prev),
-                        d_sum,
-                        to_hex(d_sum), x[node],
-                        to_hex(x[node])))
+    x = np.full(n, one // n, dtype=np.int64)
+    if (_iterate_page_rank_native is not None and
+            m.nnz >= NATIVE_MIN_EDGES and
+            not logging.getLogger(__name__).isEnabledFor(logging.DEBUG)):
+        x, iterations = _iterate_page_rank_native(
+            m.indptr, m.indices, m.data, out_deg, x, d, d_sum, tol, max_iter)
+    else:
+        x, iterations = _iterate_page_rank(
+            m, out_deg, x, d, d_sum, tol, max_iter, nodes)
 
-        # Check convergence, l1 norm
-        err = sum([abs(x[node] - x_last[node]) for node in x])
-        if err < n * tol:
-            if labels:
-                x = np.array([np.float64(x[v]) for v in labels])
-            return x, iter_no + 1  # iter t+1 happens at the end of time t
+    if not iterations:
+        raise PageRankNoConvergence(max_iter)
 
-    raise PageRankNoConvergence(max_iter)
\ No newline at end of file
+    # Ranks are indexed by node id, reorder them as `labels'
+    x = fp_to_float(x)
+    if labels:
+        x = x[[node_ids[v] for v in labels]]
+    else:
+        x = dict(zip(nodes, x))
+    return x, iterations
@@ -0,0 +1,34 @@
+import random
+import unittest
+
+import page_rank.examples.utils as utils
+
+
+class TestMkGraph(unittest.TestCase):
+
+    def _assert_valid_graph(self, node_count, edge_count):
+        random.seed(42)
+        edges, labels = utils.mk_graph(node_count, edge_count)
+
+        self.assertEqual(len(edges), edge_count)
+        self.assertEqual(len(set(edges)), edge_count)
+        self.assertEqual(set(src for src, _ in edges), set(labels))
+        self.assertTrue(set(tgt for _, tgt in edges) <= set(labels))
+
+        # Same seed, same graph
+        random.seed(42)
+        self.assertEqual(utils.mk_graph(node_count, edge_count),
+                         (edges, labels))
+
+    def test_sparse_graph(self):
+        self._assert_valid_graph(10, 40)
+
+    def test_dense_graph(self):
+        self._assert_valid_graph(10, 60)
+
+    def test_complete_graph(self):
+        self._assert_valid_graph(10, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
+import logging
 import os
 import sys
 import tempfile
 import unittest
 
+import networkx as nx
+import numpy as np
+
 import page_rank.model.tools.utils as utils
 
 
@@ -68,5 +72,140 @@ class TestInstallRequirements(unittest.TestCase):
         self.assertEqual(tqdm.__version__, '4.23.3')
 
 
+class TestFixedPointArrays(unittest.TestCase):
+
+    VALUES = [0., 1e-5, .0375, .15, .5, .85, .999, 1., 1.5]
+
+    def test_from_float(self):
+        for v in self.VALUES:
+            self.assertEqual(utils.fp_from_float(v), utils.to_fp(v).scaledval)
+
+    def test_to_float(self):
+        for v in self.VALUES:
+            self.assertEqual(utils.fp_to_float(utils.fp_from_float(v)),
+                             float(utils.to_fp(v)))
+
+    def test_mul(self):
+        xs = utils.fp_from_float(np.array(self.VALUES))
+        for v in self.VALUES:
+            expected = [(utils.to_fp(v) * utils.to_fp(x)).scaledval
+                        for x in self.VALUES]
+            self.assertEqual(
+                list(utils.fp_mul(utils.fp_from_float(v), xs)), expected)
+
+
+class TestComputePageRank(unittest.TestCase):
+
+    EDGES = [
+        ('A', 'B'),
+        ('A', 'C'),
+        ('B', 'D'),
+        ('C', 'A'),
+        ('C', 'B'),
+        ('C', 'D'),
+        ('D', 'C'),
+    ]
+    LABELS = ['A', 'B', 'C', 'D']
+
+    def _compute(self, labels, damping=.85):
+        g = nx.DiGraph(self.EDGES)
+        d_sum = (1. - damping) / len(self.LABELS)
+        return utils.compute_page_rank(g, labels, damping, d_sum, tol=1e-5)
+
+    def test_ranks(self):
+        ranks, iterations = self._compute(self.LABELS)
+
+        expected_ranks = [0.13867, 0.19761, 0.35709, 0.30664]
+        np.testing.assert_allclose(ranks, expected_ranks, atol=1e-5)
+        self.assertEqual(iterations, 15)
+
+    def test_ranks_no_labels(self):
+        ranks, _ = self._compute(None)
+        expected_ranks, _ = self._compute(self.LABELS)
+
+        self.assertEqual([ranks[lbl] for lbl in self.LABELS],
+                         list(expected_ranks))
+
+    def test_prepared_graph_reuse(self):
+        prepared = utils.prepare_page_rank(nx.DiGraph(self.EDGES))
+
+        for damping in [.85, .5]:
+            d_sum = (1. - damping) / len(self.LABELS)
+            ranks, iterations = utils.compute_page_rank_prepared(
+                prepared, self.LABELS, damping, d_sum, tol=1e-5)
+            expected_ranks, expected_iterations = self._compute(
+                self.LABELS, damping)
+
+            self.assertEqual(list(ranks), list(expected_ranks))
+            self.assertEqual(iterations, expected_iterations)
+
+    def test_debug_traces(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+
+        logger = utils.getLogger(log_level=logging.DEBUG)
+        logger.addHandler(handler)
+        try:
+            self._compute(self.LABELS)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        messages = [r.getMessage() for r in records]
+        self.assertIn('[t=0000|#  A] Sending pkt 0.125000[0.20000000]',
+                      messages)
+
+    def test_node_without_outgoing_edges(self):
+        g = nx.DiGraph([('A', 'B'), ('B', 'C'), ('C', 'A'), ('A', 'D')])
+        with self.assertRaises(ValueError):
+            utils.compute_page_rank(g, None, .85, .0375, tol=1e-5)
+
+    def test_no_convergence(self):
+        g = nx.DiGraph(self.EDGES)
+        with self.assertRaises(utils.PageRankNoConvergence):
+            utils.compute_page_rank(g, self.LABELS, .85, .0375, tol=1e-5,
+                                    max_iter=2)
+
+
+@unittest.skipIf(utils.numba is None, 'numba is not installed')
+class TestNativePageRank(unittest.TestCase):
+
+    def _iterate_both(self, tol, max_iter=100):
+        rs = np.random.RandomState(42)
+        n = 200
+        edges = set(zip(range(n), rs.randint(0, n, n)))
+        edges |= set(zip(rs.randint(0, n, 10 * n), rs.randint(0, n, 10 * n)))
+        nodes, _, m, out_deg = utils.prepare_page_rank(nx.DiGraph(list(edges)))
+
+        d = utils.fp_from_float(.85)
+        d_sum = utils.fp_from_float(.15 / n)
+        tol = utils.fp_from_float(tol)
+        x = np.full(n, utils.fp_from_float(1.) // n, dtype=np.int64)
+
+        expected = utils._iterate_page_rank(
+            m, out_deg, x.copy(), d, d_sum, tol, max_iter, nodes)
+        computed = utils._iterate_page_rank_native(
+            m.indptr, m.indices, m.data, out_deg, x.copy(), d, d_sum, tol,
+            max_iter)
+        return computed, expected
+
+    def _assert_same(self, computed, expected):
+        np.testing.assert_array_equal(computed[0], expected[0])
+        self.assertEqual(computed[1], expected[1])
+
+    def test_converged(self):
+        computed, expected = self._iterate_both(tol=1e-5)
+
+        self.assertNotEqual(expected[1], 0)
+        self._assert_same(computed, expected)
+
+    def test_not_converged(self):
+        computed, expected = self._iterate_both(tol=0, max_iter=20)
+
+        self.assertEqual(expected[1], 0)
+        self._assert_same(computed, expected)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file